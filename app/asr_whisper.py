@@ -1,9 +1,21 @@
 from faster_whisper import WhisperModel
 from pathlib import Path
-import orjson, os
+import orjson, os, threading
 from dotenv import dotenv_values
 
 CFG = dotenv_values()
+_MODELS = {}  # compute_type -> WhisperModel, kept warm across calls in `serve` mode
+_MODELS_LOCK = threading.Lock()
+
+def _get_model(compute_type: str) -> WhisperModel:
+    with _MODELS_LOCK:
+        if compute_type not in _MODELS:
+            _MODELS[compute_type] = WhisperModel(
+                CFG.get("WHISPER_MODEL","large-v3"),
+                device="cuda",
+                compute_type=compute_type,
+            )
+        return _MODELS[compute_type]
 
 def transcribe_file(audio_path: Path) -> Path:
     audio_path = Path(audio_path)
@@ -24,11 +36,7 @@ def transcribe_file(audio_path: Path) -> Path:
         try:
             print(f"Attempting transcription with compute_type={compute_type}, word_timestamps=True")
 
-            model = WhisperModel(
-                CFG.get("WHISPER_MODEL","large-v3"),
-                device="cuda",
-                compute_type=compute_type,
-            )
+            model = _get_model(compute_type)
 
             segments, info = model.transcribe(
                 str(audio_path),
@@ -53,6 +61,9 @@ def transcribe_file(audio_path: Path) -> Path:
         except RuntimeError as e:
             last_error = e
             if "cuBLAS" in str(e) or "CUBLAS" in str(e):
+                # this compute type can't run on this GPU, so don't keep it warm
+                with _MODELS_LOCK:
+                    _MODELS.pop(compute_type, None)
                 print(f"✗ cuBLAS error with {compute_type}, trying next configuration...")
                 continue
             else:
@@ -2,12 +2,13 @@ from pathlib import Path
 import orjson, json, os
 from dotenv import dotenv_values
 from app.prompts import ATTRIBUTION_PROMPT
-import requests
+from app.utils import ThroughputModel, ollama_generate
 import time
 from datetime import datetime
 from requests.exceptions import ReadTimeout
 
 CFG = dotenv_values()
+_THROUGHPUT = ThroughputModel()
 
 def _split_chunk(chunk: list) -> tuple[list, list]:
     """Split a chunk into two roughly equal halves by line count."""
@@ -15,71 +16,74 @@ def _split_chunk(chunk: list) -> tuple[list, list]:
     return chunk[:mid], chunk[mid:]
 
 def _process_chunk_with_retry(chunk: list, roster: str, chunk_num: int, total_chunks: int, max_splits: int = 2) -> list:
-    """Process a chunk with automatic splitting on timeout."""
-    current_chunks = [chunk]
-    split_level = 0
+    """Process a chunk with automatic splitting on timeout.
+
+    Pieces are handled depth-first so results stay in the original line order,
+    which summarize relies on to pair attributed lines with aligned ones.
+    """
+    split_budget = float(CFG.get("OLLAMA_SPLIT_SEC", 600))
+    all_results = []
+    stack = [(chunk, f"{chunk_num}", 0)]  # (lines, label, split level)
+
+    def _push_halves(ch: list, chunk_label: str, split_level: int):
+        left, right = _split_chunk(ch)
+        # right goes on first so left is processed next
+        stack.append((right, f"{chunk_label}.2", split_level + 1))
+        stack.append((left, f"{chunk_label}.1", split_level + 1))
+
+    while stack:
+        ch, chunk_label, split_level = stack.pop()
+        if not ch:  # Skip empty chunks
+            continue
+
+        prompt = ATTRIBUTION_PROMPT.format(
+            roster=roster,
+            lines=orjson.dumps(ch).decode()
+        )
+
+        # Split up front if observed throughput says this chunk would blow the budget
+        predicted = _THROUGHPUT.predict_seconds(prompt)
+        if predicted is not None and predicted > split_budget and split_level < max_splits and len(ch) > 1:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Chunk {chunk_label} predicted at {predicted:.0f}s (budget {split_budget:.0f}s), splitting before sending...")
+            _push_halves(ch, chunk_label, split_level)
+            continue
 
-    while current_chunks and split_level <= max_splits:
-        next_chunks = []
-        all_results = []
-
-        for i, ch in enumerate(current_chunks):
-            if not ch:  # Skip empty chunks
-                continue
+        try:
+            start_time = time.time()
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Processing chunk {chunk_label}/{total_chunks} ({len(ch)} lines, {len(orjson.dumps(ch))} chars)...")
 
-            chunk_label = f"{chunk_num}" if len(current_chunks) == 1 else f"{chunk_num}.{i+1}"
+            resp = _ollama(prompt)
+            elapsed = time.time() - start_time
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Chunk {chunk_label} completed successfully in {elapsed:.1f}s")
 
+            # Parse response
             try:
-                start_time = time.time()
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] Processing chunk {chunk_label}/{total_chunks} ({len(ch)} lines, {len(orjson.dumps(ch))} chars)...")
-
-                prompt = ATTRIBUTION_PROMPT.format(
-                    roster=roster,
-                    lines=orjson.dumps(ch).decode()
-                )
-                resp = _ollama(prompt)
-                elapsed = time.time() - start_time
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] Chunk {chunk_label} completed successfully in {elapsed:.1f}s")
-
-                # Parse response
-                try:
-                    block = json.loads(resp)
-                    all_results.extend(block)
-                except Exception:
-                    # tiny repair: look for first [ ... ] in text
-                    start = resp.find('['); end = resp.rfind(']')
-                    if start != -1 and end != -1 and end > start:
-                        try:
-                            block = json.loads(resp[start:end+1])
-                            all_results.extend(block)
-                        except Exception:
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: Failed to parse LLM response for chunk {chunk_label}")
-                    else:
-                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: No valid JSON found in response for chunk {chunk_label}")
-
-            except ReadTimeout:
-                if split_level < max_splits and len(ch) > 1:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on chunk {chunk_label}, splitting into smaller pieces...")
-                    left, right = _split_chunk(ch)
-                    next_chunks.extend([left, right])
+                block = json.loads(resp)
+                all_results.extend(block)
+            except Exception:
+                # tiny repair: look for first [ ... ] in text
+                start = resp.find('['); end = resp.rfind(']')
+                if start != -1 and end != -1 and end > start:
+                    try:
+                        block = json.loads(resp[start:end+1])
+                        all_results.extend(block)
+                    except Exception:
+                        print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: Failed to parse LLM response for chunk {chunk_label}")
                 else:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on chunk {chunk_label}, cannot split further - skipping")
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: No valid JSON found in response for chunk {chunk_label}")
 
-        if next_chunks:
-            current_chunks = next_chunks
-            split_level += 1
-        else:
-            break
+        except ReadTimeout as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {e}")
+            if split_level < max_splits and len(ch) > 1:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on chunk {chunk_label}, splitting into smaller pieces...")
+                _push_halves(ch, chunk_label, split_level)
+            else:
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on chunk {chunk_label}, cannot split further - skipping")
 
     return all_results
 
 def _ollama(prompt: str):
-    url = f"{CFG.get('OLLAMA_HOST','http://127.0.0.1:11434')}/api/generate"
-    payload = {"model": CFG.get("OLLAMA_MODEL","gpt-oss:20b"),
-               "prompt": prompt, "stream": False}
-    r = requests.post(url, json=payload, timeout=1200)
-    r.raise_for_status()
-    return r.json()["response"]
+    return ollama_generate(prompt, CFG, _THROUGHPUT)
 
 def attribute_characters(session_id: str, roster_path: Path) -> Path:
     aligned = orjson.loads(Path(f"data/aligned/{session_id}.json").read_bytes())
@@ -2,46 +2,102 @@ import typer
 from pathlib import Path
 from dotenv import load_dotenv
 
-from app.asr_whisper import transcribe_file
-from app.align import align_asr_speakers
-from app.attribute import attribute_characters
-from app.summarize import summarize_session
-from app.embed_index import ingest_session
+# Pipeline modules are imported lazily inside each command so that, when a `serve`
+# process is running, the CLI acts as a thin client without loading models itself.
+from app import serve as server
 
 app = typer.Typer(help="Starfire pipeline CLI")
+STATE = {"local": False}
+
+@app.callback()
+def main(local: bool = typer.Option(False, "--local", help="Run in-process even if a server is up")):
+    STATE["local"] = local
+
+def _remote(command: str, **args):
+    """Run `command` on the server if one is available; None means run it locally."""
+    if STATE["local"] or not server.server_available():
+        return None
+    job = server.submit_and_wait(command, args)
+    if job["status"] != "done":
+        typer.echo(f"Job {job['id']} failed: {job['error']}", err=True)
+        raise typer.Exit(1)
+    return job["result"]
 
 @app.command()
 def transcribe(audio_path: Path):
-    out = transcribe_file(audio_path)
+    out = _remote("transcribe", audio_path=str(audio_path.resolve()))
+    if out is None:
+        from app.asr_whisper import transcribe_file
+        out = transcribe_file(audio_path)
     typer.echo(f"Transcript saved: {out}")
 
 @app.command()
 def diarize(audio_path: Path):
-    # <-- lazy import so transcribe doesn't pull pyannote
-    from app.diarize import diarize_file
-    out = diarize_file(audio_path)
+    out = _remote("diarize", audio_path=str(audio_path.resolve()))
+    if out is None:
+        # <-- lazy import so transcribe doesn't pull pyannote
+        from app.diarize import diarize_file
+        out = diarize_file(audio_path)
     typer.echo(f"Diarization saved: {out}")
 
 @app.command()
 def align(session_id: str):
-    out = align_asr_speakers(session_id)
+    out = _remote("align", session_id=session_id)
+    if out is None:
+        from app.align import align_asr_speakers
+        out = align_asr_speakers(session_id)
     typer.echo(f"Aligned JSON: {out}")
 
 @app.command()
 def attribute(session_id: str, roster_path: Path):
-    out = attribute_characters(session_id, roster_path)
+    out = _remote("attribute", session_id=session_id, roster_path=str(roster_path.resolve()))
+    if out is None:
+        from app.attribute import attribute_characters
+        out = attribute_characters(session_id, roster_path)
     typer.echo(f"Attributed dialogue: {out}")
 
 @app.command()
 def summarize(session_id: str):
-    out = summarize_session(session_id)
+    out = _remote("summarize", session_id=session_id)
+    if out is None:
+        from app.summarize import summarize_session
+        out = summarize_session(session_id)
     typer.echo(f"Summaries: {out}")
 
+@app.command()
+def rollup(arcs_path: Path = typer.Option(None, "--arcs", help="JSON mapping arc name -> [session ids]")):
+    """Roll scene summaries up into session, arc and campaign recaps."""
+    out = _remote("rollup", arcs_path=str(arcs_path.resolve()) if arcs_path else None)
+    if out is None:
+        from app.rollup import rollup_campaign
+        out = rollup_campaign(arcs_path)
+    typer.echo(f"Campaign rollup: {out}")
+
 @app.command()
 def index(session_id: str):
-    ingest_session(session_id)
+    if _remote("index", session_id=session_id) is None:
+        from app.embed_index import ingest_session
+        ingest_session(session_id)
     typer.echo("Indexed to Chroma.")
 
+@app.command()
+def search(query: str, n: int = 5, session: str = None):
+    if not STATE["local"] and server.server_available():
+        hits = server.search(query, n, session)
+    else:
+        from app.embed_index import query_index
+        hits = query_index(query, n, session)
+    for h in hits:
+        typer.echo(f"[{h['distance']:.3f}] {h['id']}: {h['document']}")
+
+@app.command()
+def serve(host: str = None, port: int = None,
+          preload: str = typer.Option("chroma", help="Comma-separated: whisper,pyannote,chroma")):
+    """Keep models and indexes warm and accept jobs over HTTP."""
+    host = host or server.CFG.get("SERVE_HOST", "127.0.0.1")
+    port = port or int(server.CFG.get("SERVE_PORT", 8765))
+    server.serve_forever(host, port, [p.strip() for p in preload.split(",") if p.strip()])
+
 if __name__ == "__main__":
     load_dotenv()
-    app()
\ No newline at end of file
+    app()
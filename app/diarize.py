@@ -1,18 +1,27 @@
 from pathlib import Path
-import orjson, os
+import orjson, os, threading
 from dotenv import dotenv_values
 from pyannote.audio import Pipeline
 
 CFG = dotenv_values()
+_PIPELINE = None  # kept warm across calls in `serve` mode
+_PIPELINE_LOCK = threading.Lock()
+
+def _get_pipeline() -> Pipeline:
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            _PIPELINE = Pipeline.from_pretrained(
+                CFG.get("PYANNOTE_PIPELINE", "pyannote/speaker-diarization-3.1"),
+                use_auth_token=CFG.get("HF_TOKEN")
+            )
+    return _PIPELINE
 
 def diarize_file(audio_path: Path) -> Path:
     out_dir = Path("data/diarization"); out_dir.mkdir(parents=True, exist_ok=True)
     session_id = Path(audio_path).stem
 
-    pipeline = Pipeline.from_pretrained(
-        CFG.get("PYANNOTE_PIPELINE", "pyannote/speaker-diarization-3.1"),
-        use_auth_token=CFG.get("HF_TOKEN")
-    )
+    pipeline = _get_pipeline()
     diarization = pipeline(str(audio_path))
 
     # Save RTTM-like JSON
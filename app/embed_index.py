@@ -1,10 +1,20 @@
 from pathlib import Path
-import chromadb, orjson
+import chromadb, orjson, threading
 from chromadb.utils import embedding_functions
 
+_COLLECTION = None  # client + embedder kept warm across calls in `serve` mode
+_COLLECTION_LOCK = threading.Lock()
+
+def _get_collection():
+    global _COLLECTION
+    with _COLLECTION_LOCK:
+        if _COLLECTION is None:
+            client = chromadb.PersistentClient(path="chroma")
+            _COLLECTION = client.get_or_create_collection(name="starfire")
+    return _COLLECTION
+
 def ingest_session(session_id: str):
-    client = chromadb.PersistentClient(path="chroma")
-    coll = client.get_or_create_collection(name="starfire")
+    coll = _get_collection()
 
     # simple bag-of-words embedding is weak; use OpenAI or local if you prefer.
     # Placeholder: use Chroma's default embedder if present, else text-as-id.
@@ -27,4 +37,14 @@ def ingest_session(session_id: str):
             metas.append({"session": session_id, "type":"summary", "idx": i})
             ids.append(f"{session_id}-sum-{i}")
 
-    coll.add(documents=docs, metadatas=metas, ids=ids)
\ No newline at end of file
+    coll.add(documents=docs, metadatas=metas, ids=ids)
+
+def query_index(text: str, n_results: int = 5, session: str = None) -> list:
+    coll = _get_collection()
+    where = {"session": session} if session else None
+    res = coll.query(query_texts=[text], n_results=n_results, where=where)
+    hits = []
+    for i, doc, meta, dist in zip(res["ids"][0], res["documents"][0],
+                                  res["metadatas"][0], res["distances"][0]):
+        hits.append({"id": i, "document": doc, "metadata": meta, "distance": dist})
+    return hits
@@ -26,4 +26,16 @@ Return JSON with fields: summary, beats[], entities{{characters[], locations[],
 
 SCENE:
 {scene}
-"""
\ No newline at end of file
+"""
+
+ROLLUP_PROMPT = """You are a story editor condensing a D&D campaign. Below are the {child_level} summaries that make up one {level}, in order.
+
+Provide:
+1) A {level} recap of one or two paragraphs focusing on story and character developments
+2) Key story beats (bullet points of the most important events)
+
+Return JSON with fields: summary, beats[].
+
+{child_level_upper} SUMMARIES:
+{children}
+"""
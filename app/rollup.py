@@ -0,0 +1,209 @@
+from pathlib import Path
+import orjson, json, hashlib, re
+from datetime import datetime
+from dotenv import dotenv_values
+from requests.exceptions import ReadTimeout
+from typing import List, Dict
+from app.prompts import ROLLUP_PROMPT
+from app.utils import ThroughputModel, ollama_generate
+
+CFG = dotenv_values()
+_THROUGHPUT = ThroughputModel()
+
+# Summary tree: scene -> session -> arc -> (part ->) campaign. Each node is cached under a hash of
+# its children's labels and keys, so appending a session only recomputes that session, its arc and
+# the campaign root.
+ROLLUP_VERSION = 1  # bump to invalidate cached nodes when the prompt changes
+ENTITY_FIELDS = {"characters": "characters_present", "locations": "locations", "items": "items_mentioned"}
+
+def _ollama(prompt: str):
+    return ollama_generate(prompt, CFG, _THROUGHPUT)
+
+def _hash(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(orjson.dumps(p, option=orjson.OPT_SORT_KEYS))
+    return h.hexdigest()[:16]
+
+def _scene_index(scene: Dict, session_id: str) -> Dict:
+    """Entity index for a single scene record: {kind: {name: {scenes, sessions[]}}}."""
+    index = {kind: {} for kind in ENTITY_FIELDS}
+    for kind, field in ENTITY_FIELDS.items():
+        for name in scene.get(field, []):
+            index[kind][name] = {"scenes": 1, "sessions": [session_id]}
+    return index
+
+def _merge_indexes(indexes: List[Dict]) -> Dict:
+    merged = {kind: {} for kind in ENTITY_FIELDS}
+    for index in indexes:
+        for kind in ENTITY_FIELDS:
+            for name, entry in index.get(kind, {}).items():
+                cur = merged[kind].setdefault(name, {"scenes": 0, "sessions": []})
+                cur["scenes"] += entry["scenes"]
+                cur["sessions"].extend(s for s in entry["sessions"] if s not in cur["sessions"])
+    return merged
+
+def _parse_summary(resp: str) -> Dict:
+    try:
+        return json.loads(resp)
+    except Exception:
+        start = resp.find('{'); end = resp.rfind('}')
+        if start != -1 and end != -1:
+            try:
+                return json.loads(resp[start:end+1])
+            except Exception:
+                pass
+    return None
+
+def _child_text(label: str, child: Dict) -> str:
+    lines = [f"[{label}] {child.get('summary', '')}"]
+    lines += [f"- {b}" for b in child.get("beats", []) if isinstance(b, str)]
+    return "\n".join(lines)
+
+def _build_node(level: str, node_id: str, child_level: str, children: List[tuple], nodes_dir: Path) -> Dict:
+    """Return the cached node for these children, or summarize them and cache the result.
+
+    `children` is a list of (label, child_node) pairs in story order. Failed children are
+    left out of the prompt and listed under "omitted"; since their failure is part of the
+    key, the node is rebuilt once they succeed.
+    """
+    # labels appear in the prompt (e.g. arc names from --arcs), so they're part of the key
+    key = _hash(ROLLUP_VERSION, level, [[label, c["key"], bool(c.get("failed"))] for label, c in children])
+    node_path = nodes_dir / f"{key}.json"
+    if node_path.exists():
+        node = orjson.loads(node_path.read_bytes())
+        node["id"] = node_id  # ids (e.g. auto arc names) aren't part of the key
+        return node
+
+    node = {
+        "key": key, "level": level, "id": node_id,
+        "children": [c["key"] for _, c in children],
+        "index": _merge_indexes([c["index"] for _, c in children]),
+    }
+    usable = [(label, c) for label, c in children if not c.get("failed")]
+    omitted = [label for label, c in children if c.get("failed")]
+    if omitted:
+        node["omitted"] = omitted
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: {level} {node_id} leaves out failed {child_level}s: {', '.join(map(str, omitted))}")
+    if not usable:
+        node.update({"summary": "Rollup failed", "beats": [], "failed": True})
+        return node  # nothing to summarize; retried once a child succeeds
+
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Rolling up {level} {node_id} from {len(usable)} {child_level}s...")
+    prompt = ROLLUP_PROMPT.format(
+        level=level, child_level=child_level, child_level_upper=child_level.upper(),
+        children="\n\n".join(_child_text(label, c) for label, c in usable)
+    )
+    try:
+        summary_data = _parse_summary(_ollama(prompt))
+    except ReadTimeout as e:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on {level} {node_id} ({e}) - not cached")
+        summary_data = None
+    if not isinstance(summary_data, dict):  # unparseable, or a JSON list/string
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: Could not summarize {level} {node_id}")
+        node.update({"summary": "Rollup failed", "beats": [], "failed": True})
+        return node  # leave uncached so the next run retries it
+
+    beats = summary_data.get("beats", [])
+    node.update({"summary": str(summary_data.get("summary", "")),
+                 "beats": beats if isinstance(beats, list) else [beats]})
+    node_path.write_bytes(orjson.dumps(node))
+    return node
+
+def _scene_nodes(session_id: str, summ_path: Path) -> List[tuple]:
+    children = []
+    for line in summ_path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        scene = orjson.loads(line)
+        children.append((f"Scene {scene.get('scene_id')}", {
+            "key": _hash(session_id, scene),
+            "summary": scene.get("summary", ""),
+            "beats": scene.get("beats", []),
+            "index": _scene_index(scene, session_id),
+        }))
+    return children
+
+def _natural_key(session_id: str) -> list:
+    """Sort key treating digit runs as numbers, so Session2 comes before Session10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", session_id)]
+
+def _group_arcs(session_ids: List[str], arcs_path: Path = None) -> List[tuple]:
+    """(arc_name, [session_ids]) pairs, from an arcs JSON file or fixed-size groups.
+
+    Fixed-size groups follow session order, so a session that sorts into the middle
+    shifts every later arc and they are all recomputed.
+    """
+    if arcs_path is not None:
+        arcs = orjson.loads(Path(arcs_path).read_bytes())
+        assigned = {s for sessions in arcs.values() for s in sessions}
+        missing = sorted(assigned - set(session_ids), key=_natural_key)
+        if missing:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: No completed summaries for {', '.join(missing)} (listed in {arcs_path})")
+        groups = [(name, [s for s in sessions if s in session_ids]) for name, sessions in arcs.items()]
+        unassigned = [s for s in session_ids if s not in assigned]
+        if unassigned:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: {', '.join(unassigned)} not in any arc in {arcs_path} - adding to 'Unassigned'")
+            groups.append(("Unassigned", unassigned))
+        return groups
+    size = max(1, int(CFG.get("ROLLUP_ARC_SIZE", 4)))
+    return [(f"Arc {i // size + 1}", session_ids[i:i + size]) for i in range(0, len(session_ids), size)]
+
+def rollup_campaign(arcs_path: Path = None) -> Path:
+    """Build the scene -> session -> arc -> campaign summary tree over data/summaries."""
+    summ_dir = Path("data/summaries")
+    out_dir = Path("data/rollups")
+    nodes_dir = out_dir / "nodes"
+    nodes_dir.mkdir(parents=True, exist_ok=True)
+
+    # Only roll up sessions whose scene summaries are complete
+    session_ids = sorted((p.stem for p in summ_dir.glob("*.jsonl")
+                          if not (summ_dir / f"{p.stem}.checkpoint").exists()), key=_natural_key)
+    if not session_ids:
+        raise FileNotFoundError(f"No completed session summaries found in {summ_dir}")
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Rolling up {len(session_ids)} sessions")
+
+    sessions = {}
+    for session_id in session_ids:
+        scenes = _scene_nodes(session_id, summ_dir / f"{session_id}.jsonl")
+        if not scenes:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Warning: No scenes for {session_id} - skipping")
+            continue
+        sessions[session_id] = _build_node("session", session_id, "scene", scenes, nodes_dir)
+        (out_dir / f"{session_id}.json").write_bytes(
+            orjson.dumps(sessions[session_id], option=orjson.OPT_INDENT_2))
+
+    arcs = []
+    for arc_name, arc_sessions in _group_arcs(list(sessions), arcs_path):
+        children = [(sid, sessions[sid]) for sid in arc_sessions if sid in sessions]
+        if children:
+            arcs.append((arc_name, [sid for sid, _ in children],
+                         _build_node("arc", arc_name, "session", children, nodes_dir)))
+
+    if not arcs:
+        raise ValueError("No sessions with scenes to roll up" +
+                         (f" (check session ids in {arcs_path})" if arcs_path else ""))
+
+    # Bound every prompt to ROLLUP_FANOUT children: while there are too many arcs for one
+    # campaign prompt, group consecutive nodes into parts (and parts into parts). Appending
+    # a session only changes the last node at each level.
+    fanout = max(2, int(CFG.get("ROLLUP_FANOUT", 8)))
+    level_nodes, child_level = [(name, arc) for name, _, arc in arcs], "arc"
+    while len(level_nodes) > fanout:
+        level_nodes = [(f"Part {i // fanout + 1}",
+                        _build_node("part", f"Part {i // fanout + 1}", child_level, level_nodes[i:i + fanout], nodes_dir))
+                       for i in range(0, len(level_nodes), fanout)]
+        child_level = "part"
+    campaign = _build_node("campaign", "campaign", child_level, level_nodes, nodes_dir)
+
+    out_path = out_dir / "campaign.json"
+    out_path.write_bytes(orjson.dumps({
+        "summary": campaign["summary"],
+        "beats": campaign["beats"],
+        "arcs": [{"name": name, "sessions": sids, "summary": arc["summary"], "beats": arc["beats"]}
+                 for name, sids, arc in arcs],
+        "updated": datetime.now().isoformat(),
+    }, option=orjson.OPT_INDENT_2))
+    (out_dir / "campaign_index.json").write_bytes(orjson.dumps(campaign["index"], option=orjson.OPT_INDENT_2))
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Campaign rollup complete!")
+    return out_path
@@ -0,0 +1,321 @@
+from pathlib import Path
+import orjson, os, sys, queue, threading, time, uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import dotenv_values
+import requests
+
+CFG = dotenv_values()
+
+# Long-running server that keeps Whisper, pyannote, Chroma and the Ollama throughput
+# estimates warm between jobs. Heavy modules are imported lazily by each runner.
+
+def _run_transcribe(args: dict) -> str:
+    from app.asr_whisper import transcribe_file
+    return str(transcribe_file(Path(args["audio_path"])))
+
+def _run_diarize(args: dict) -> str:
+    from app.diarize import diarize_file
+    return str(diarize_file(Path(args["audio_path"])))
+
+def _run_align(args: dict) -> str:
+    from app.align import align_asr_speakers
+    return str(align_asr_speakers(args["session_id"]))
+
+def _run_attribute(args: dict) -> str:
+    from app.attribute import attribute_characters
+    return str(attribute_characters(args["session_id"], Path(args["roster_path"])))
+
+def _run_summarize(args: dict) -> str:
+    from app.summarize import summarize_session
+    return str(summarize_session(args["session_id"]))
+
+def _run_rollup(args: dict) -> str:
+    from app.rollup import rollup_campaign
+    arcs_path = args.get("arcs_path")
+    return str(rollup_campaign(Path(arcs_path) if arcs_path else None))
+
+def _run_index(args: dict) -> str:
+    from app.embed_index import ingest_session
+    ingest_session(args["session_id"])
+    return args["session_id"]
+
+# command -> (resource, runner); jobs sharing a resource share its concurrency limit
+COMMANDS = {
+    "transcribe": ("whisper", _run_transcribe),
+    "diarize":    ("pyannote", _run_diarize),
+    "align":      ("cpu", _run_align),
+    "attribute":  ("ollama", _run_attribute),
+    "summarize":  ("ollama", _run_summarize),
+    "rollup":     ("ollama", _run_rollup),
+    "index":      ("chroma", _run_index),
+}
+
+DEFAULT_LIMITS = {"whisper": 1, "pyannote": 1, "ollama": 1, "chroma": 1, "cpu": 2, "gpu": 1}
+
+# Whisper, pyannote and the Ollama model all share one CUDA device, so jobs on these
+# resources also hold a "gpu" slot; by default only one of them runs at a time.
+GPU_RESOURCES = {"whisper", "pyannote", "ollama"}
+
+def _warm_whisper():
+    from app.asr_whisper import _get_model
+    _get_model(CFG.get("WHISPER_COMPUTE", "int8_float16"))
+
+def _warm_pyannote():
+    from app.diarize import _get_pipeline
+    _get_pipeline()
+
+def _warm_chroma():
+    from app.embed_index import _get_collection
+    _get_collection()
+
+WARMERS = {"whisper": _warm_whisper, "pyannote": _warm_pyannote, "chroma": _warm_chroma}
+
+LOG_TAIL = 200  # log lines kept per job for clients to poll
+
+_current = threading.local()  # job_id of the job a worker thread is running
+
+class _JobOutput:
+    """sys.stdout stand-in that echoes to the console and records worker output on its job."""
+
+    def __init__(self, stream, jobs: "JobQueue"):
+        self.stream = stream
+        self.jobs = jobs
+
+    def write(self, text: str):
+        self.stream.write(text)
+        job_id = getattr(_current, "job_id", None)
+        if job_id:
+            pending = getattr(_current, "pending", "") + text
+            *lines, _current.pending = pending.split("\n")
+            if lines:
+                self.jobs._log(job_id, lines)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        # isatty(), encoding, fileno() etc. come from the real stream
+        return getattr(self.stream, name)
+
+class JobQueue:
+    """FIFO queue per resource, drained by as many workers as that resource's limit.
+
+    GPU-backed resources additionally share the "gpu" semaphore. Each resource also has
+    a semaphore of its own so synchronous reads (search) count against the same limit.
+    """
+
+    def __init__(self, limits: dict, max_jobs: int = 200):
+        self.limits = limits
+        self.max_jobs = max_jobs
+        self.jobs = {}  # insertion order == submission order
+        self.lock = threading.Lock()
+        self.queues = {}
+        self.gpu = threading.Semaphore(max(1, limits.get("gpu", 1)))
+        self.slots = {}
+        for resource, limit in limits.items():
+            if resource == "gpu":
+                continue
+            self.slots[resource] = threading.Semaphore(max(1, limit))
+            q = queue.Queue()
+            self.queues[resource] = q
+            for _ in range(max(1, limit)):
+                threading.Thread(target=self._worker, args=(q,), daemon=True).start()
+
+    def submit(self, command: str, args: dict) -> dict:
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command: {command}")
+        resource, _ = COMMANDS[command]
+        job = {"id": uuid.uuid4().hex[:12], "command": command, "args": args,
+               "resource": resource, "status": "queued", "result": None, "error": None,
+               "submitted": datetime.now().isoformat(), "started": None, "finished": None,
+               "log": [], "log_lines": 0}
+        with self.lock:
+            self._prune()
+            self.jobs[job["id"]] = job
+        self.queues[resource].put(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> list:
+        with self.lock:
+            return [{k: v for k, v in j.items() if k != "log"} for j in self.jobs.values()]
+
+    def _update(self, job_id: str, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _log(self, job_id: str, lines: list):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job["log"] = (job["log"] + lines)[-LOG_TAIL:]
+                job["log_lines"] += len(lines)  # total ever logged, so clients can tell what's new
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond SERVE_MAX_JOBS (caller holds the lock)."""
+        finished = [j["id"] for j in self.jobs.values() if j["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def _worker(self, q: queue.Queue):
+        while True:
+            job_id = q.get()
+            job = self.get(job_id)
+            resource, runner = COMMANDS[job["command"]]
+            with self.slots[resource]:
+                if resource in GPU_RESOURCES:
+                    self.gpu.acquire()  # job stays "queued" until the GPU is free
+                try:
+                    self._run(job_id, job, runner)
+                finally:
+                    if resource in GPU_RESOURCES:
+                        self.gpu.release()
+
+    def run_now(self, resource: str, fn):
+        """Run `fn` on the calling thread once a `resource` slot is free (no job record)."""
+        with self.slots[resource]:
+            return fn()
+
+    def _run(self, job_id: str, job: dict, runner):
+        self._update(job_id, status="running", started=datetime.now().isoformat())
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Job {job_id} ({job['command']}) started")
+        _current.job_id, _current.pending = job_id, ""
+        try:
+            result = runner(job["args"])
+            self._update(job_id, status="done", result=result, finished=datetime.now().isoformat())
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Job {job_id} done: {result}")
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"{type(e).__name__}: {e}",
+                         finished=datetime.now().isoformat())
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Job {job_id} failed: {e}")
+        finally:
+            _current.job_id = None
+
+def _make_handler(jobs: JobQueue):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            data = orjson.dumps(body)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if parts == ["health"]:
+                self._send(200, {"status": "ok", "cwd": os.getcwd()})
+            elif parts == ["jobs"]:
+                self._send(200, {"jobs": jobs.list()})
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = jobs.get(parts[1])
+                if job:
+                    self._send(200, job)
+                else:
+                    self._send(404, {"error": f"No such job: {parts[1]}"})
+            elif parts == ["search"]:
+                from app.embed_index import query_index
+                qs = parse_qs(url.query)
+                if not qs.get("q"):
+                    self._send(400, {"error": "Missing query parameter 'q'"})
+                    return
+                try:
+                    # reads skip the job queue but share SERVE_LIMIT_CHROMA with index jobs
+                    hits = jobs.run_now("chroma", lambda: query_index(
+                        qs["q"][0], int(qs.get("n", ["5"])[0]), qs.get("session", [None])[0]))
+                    self._send(200, {"hits": hits})
+                except Exception as e:
+                    self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            else:
+                self._send(404, {"error": f"Not found: {url.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path.strip("/") != "jobs":
+                self._send(404, {"error": f"Not found: {self.path}"})
+                return
+            try:
+                body = orjson.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not isinstance(body, dict):
+                    raise ValueError("Request body must be a JSON object")
+                args = body.get("args", {})
+                if not isinstance(args, dict):
+                    raise ValueError("'args' must be a JSON object")
+                job = jobs.submit(body.get("command", ""), args)
+            except ValueError as e:  # includes orjson.JSONDecodeError
+                self._send(400, {"error": str(e)})
+                return
+            self._send(202, job)
+
+        def log_message(self, format, *args):
+            pass  # job progress is printed by the workers
+
+    return Handler
+
+def _limits() -> dict:
+    return {r: int(CFG.get(f"SERVE_LIMIT_{r.upper()}", n)) for r, n in DEFAULT_LIMITS.items()}
+
+def serve_forever(host: str, port: int, preload: list):
+    for name in preload:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Warming {name}...")
+        WARMERS[name]()
+    jobs = JobQueue(_limits(), int(CFG.get("SERVE_MAX_JOBS", 200)))
+    sys.stdout = _JobOutput(sys.stdout, jobs)
+    server = ThreadingHTTPServer((host, port), _make_handler(jobs))
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Serving on http://{host}:{port} from {os.getcwd()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# --- thin client used by the CLI ---
+
+def server_url() -> str:
+    return f"http://{CFG.get('SERVE_HOST', '127.0.0.1')}:{CFG.get('SERVE_PORT', '8765')}"
+
+def server_available() -> bool:
+    """True if a server is up and was started from this directory (data/ paths are relative)."""
+    try:
+        r = requests.get(f"{server_url()}/health", timeout=0.5)
+        return r.ok and Path(r.json()["cwd"]).resolve() == Path.cwd().resolve()
+    except Exception:
+        return False
+
+def submit_and_wait(command: str, args: dict, poll_sec: float = 1.0) -> dict:
+    r = requests.post(f"{server_url()}/jobs", json={"command": command, "args": args}, timeout=10)
+    r.raise_for_status()
+    job = r.json()
+    print(f"Submitted {command} as job {job['id']} to {server_url()}")
+    start, seen, status = time.time(), 0, None
+    while True:
+        if job["status"] != status:
+            status = job["status"]
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] Job {job['id']} {status} ({time.time() - start:.0f}s elapsed)")
+        # echo the server-side progress lines this client hasn't printed yet
+        new = job["log_lines"] - seen
+        for line in job["log"][-new:] if new > 0 else []:
+            print(line)
+        seen = job["log_lines"]
+        if status not in ("queued", "running"):
+            return job
+        time.sleep(poll_sec)
+        r = requests.get(f"{server_url()}/jobs/{job['id']}", timeout=10)
+        r.raise_for_status()
+        job = r.json()
+
+def search(text: str, n_results: int = 5, session: str = None) -> list:
+    params = {"q": text, "n": n_results}
+    if session:
+        params["session"] = session
+    r = requests.get(f"{server_url()}/search", params=params, timeout=30)
+    r.raise_for_status()
+    return r.json()["hits"]
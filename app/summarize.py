@@ -1,20 +1,17 @@
 from pathlib import Path
-import orjson, json, requests
+import orjson, json
 import time
 from datetime import datetime
 from dotenv import dotenv_values
 from requests.exceptions import ReadTimeout
 from typing import List, Dict, Any
+from app.utils import ThroughputModel, ollama_generate
 
 CFG = dotenv_values()
+_THROUGHPUT = ThroughputModel()
 
 def _ollama(prompt: str):
-    url = f"{CFG.get('OLLAMA_HOST','http://127.0.0.1:11434')}/api/generate"
-    payload = {"model": CFG.get("OLLAMA_MODEL","gpt-oss:20b"),
-               "prompt": prompt, "stream": False}
-    r = requests.post(url, json=payload, timeout=1200)
-    r.raise_for_status()
-    return r.json()["response"]
+    return ollama_generate(prompt, CFG, _THROUGHPUT)
 
 def _detect_scene_breaks(attributed_lines: List[Dict]) -> List[int]:
     """Detect natural scene boundaries in D&D dialogue."""
@@ -212,8 +209,8 @@ SCENE DIALOGUE:
 
         return summary_data
 
-    except ReadTimeout:
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on scene {scene_num} - skipping")
+    except ReadTimeout as e:
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] Timeout on scene {scene_num} ({e}) - skipping")
         return {"summary": "Scene timed out during processing", "beats": [], "character_moments": []}
 
 def summarize_session(session_id: str) -> Path:
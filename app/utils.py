@@ -0,0 +1,151 @@
+import queue, threading, time, socket, http.client
+from urllib.parse import urlparse
+import orjson, requests
+from requests.exceptions import ReadTimeout
+
+class OllamaStall(ReadTimeout):
+    """Raised when Ollama stops streaming tokens or overruns its predicted deadline.
+
+    Subclasses ReadTimeout so existing split/skip-on-timeout handlers pick it up.
+    """
+
+class ThroughputModel:
+    """Running estimate of Ollama speed, used to predict how long a prompt will take."""
+
+    CHARS_PER_TOKEN = 4.0  # rough; prompt_eval_count is unreliable once the KV cache kicks in
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.prompt_tps = None    # prompt tokens/sec
+        self.eval_tps = None      # generated tokens/sec
+        self.output_ratio = None  # generated tokens per prompt token
+
+    def _ema(self, old, new):
+        return new if old is None else (1 - self.alpha) * old + self.alpha * new
+
+    def prompt_tokens(self, prompt: str) -> float:
+        return max(1.0, len(prompt) / self.CHARS_PER_TOKEN)
+
+    def observe(self, prompt: str, stats: dict):
+        """Fold the timing fields of Ollama's final `done` chunk into the estimates."""
+        p_count, p_dur = stats.get("prompt_eval_count") or 0, stats.get("prompt_eval_duration") or 0
+        e_count, e_dur = stats.get("eval_count") or 0, stats.get("eval_duration") or 0
+        if p_count and p_dur:
+            self.prompt_tps = self._ema(self.prompt_tps, p_count / (p_dur / 1e9))
+        if e_count and e_dur:
+            self.eval_tps = self._ema(self.eval_tps, e_count / (e_dur / 1e9))
+            self.output_ratio = self._ema(self.output_ratio, e_count / self.prompt_tokens(prompt))
+
+    def predict_seconds(self, prompt: str):
+        """Predicted wall time for `prompt`, or None until a chunk has been observed."""
+        if self.eval_tps is None or self.output_ratio is None:
+            return None
+        n = self.prompt_tokens(prompt)
+        prompt_sec = n / self.prompt_tps if self.prompt_tps else 0.0
+        return prompt_sec + n * self.output_ratio / self.eval_tps
+
+    def timeout_for(self, prompt: str, factor: float, floor: float, cap: float) -> float:
+        predicted = self.predict_seconds(prompt)
+        if predicted is None:
+            return cap
+        return min(cap, max(floor, predicted * factor))
+
+def _pump(url: str, payload: dict, first: float, stall: float, q: queue.Queue,
+          abort: threading.Event, holder: list):
+    """Worker: push each streamed chunk onto `q`, then None on clean end (or the exception).
+
+    Uses http.client rather than requests so the socket is reachable (via `holder`) before
+    the response headers arrive, and so its read timeout can drop from the first-token
+    window to the stall window once streaming starts.
+    """
+    u = urlparse(url)
+    cls = http.client.HTTPSConnection if u.scheme == "https" else http.client.HTTPConnection
+    conn = cls(u.hostname, u.port, timeout=first)
+    holder.append(conn)
+    try:
+        conn.request("POST", u.path, body=orjson.dumps(payload),
+                     headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()  # Ollama sends headers with the first chunk
+        if resp.status >= 400:
+            raise requests.HTTPError(f"{resp.status} {resp.reason} for url: {url}")
+        conn.sock.settimeout(stall)
+        for raw in resp:
+            if abort.is_set():
+                return
+            raw = raw.strip()
+            if raw:
+                q.put(orjson.loads(raw))
+        q.put(None)
+    except socket.timeout:
+        q.put(OllamaStall("Ollama connection timed out"))
+    except Exception as e:
+        q.put(e)
+    finally:
+        conn.close()
+
+def ollama_generate(prompt: str, cfg: dict, model: ThroughputModel = None) -> str:
+    """Stream a completion from Ollama with a stall watchdog and an adaptive overall timeout.
+
+    Raises OllamaStall if no chunk arrives within OLLAMA_STALL_SEC (OLLAMA_FIRST_TOKEN_SEC
+    before the first one, to cover model load and prompt eval), or if the whole request
+    overruns the timeout predicted from `model`'s observed throughput, or if the stream
+    closes without a `done` chunk. An `error` line in the stream raises requests.HTTPError,
+    as a non-streamed error response would.
+    """
+    url = f"{cfg.get('OLLAMA_HOST','http://127.0.0.1:11434')}/api/generate"
+    payload = {"model": cfg.get("OLLAMA_MODEL","gpt-oss:20b"),
+               "prompt": prompt, "stream": True}
+    stall = float(cfg.get("OLLAMA_STALL_SEC", 60))
+    first = float(cfg.get("OLLAMA_FIRST_TOKEN_SEC", 300))
+    cap = float(cfg.get("OLLAMA_TIMEOUT", 1200))
+    overall = cap
+    if model is not None:
+        overall = model.timeout_for(prompt, float(cfg.get("OLLAMA_TIMEOUT_FACTOR", 2.0)),
+                                    float(cfg.get("OLLAMA_MIN_TIMEOUT", 120)), cap)
+
+    q, abort, holder = queue.Queue(), threading.Event(), []
+    threading.Thread(target=_pump, args=(url, payload, min(first, overall), stall, q, abort, holder),
+                     daemon=True).start()
+
+    def _abort(reason: str):
+        abort.set()
+        # Shut the socket down, whether or not headers have arrived: this unblocks the
+        # worker's read and the disconnect makes Ollama cancel the abandoned generation.
+        for conn in holder:
+            try:
+                if conn.sock is not None:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        raise OllamaStall(reason)
+
+    deadline = time.time() + overall
+    parts, got_first = [], False
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            _abort(f"Ollama exceeded {overall:.0f}s budget")
+        wait = min(stall if got_first else first, remaining)
+        try:
+            item = q.get(timeout=wait)
+        except queue.Empty:
+            if time.time() >= deadline:
+                _abort(f"Ollama exceeded {overall:.0f}s budget")
+            _abort(f"Ollama produced no tokens for {wait:.0f}s")
+        if item is None:
+            # stream closed without a `done` chunk, e.g. the runner crashed mid-generation
+            _abort(f"Ollama stream ended before completion ({len(parts)} chunks received)")
+        if isinstance(item, Exception):
+            raise item
+        if "error" in item:
+            # mid-stream failures still arrive with HTTP 200, as an error line
+            abort.set()
+            raise requests.HTTPError(f"Ollama error: {item['error']}")
+        # any chunk counts as progress, including "thinking" chunks with an empty response
+        got_first = True
+        parts.append(item.get("response", ""))
+        if item.get("done"):
+            abort.set()
+            if model is not None:
+                model.observe(prompt, item)
+            return "".join(parts)